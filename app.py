@@ -10,15 +10,16 @@ config = picam2.create_video_configuration(main={"size": (640, 480)})
 picam2.configure(config)
 picam2.start()
 
+# Multipart part header, joined with each JPEG into a single chunk per frame
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
 def generate_frames():
     while True:
         frame = picam2.capture_array()
         # Encode as JPEG
         ret, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        # Yield as multipart stream
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        # Yield as multipart stream, copying the encoded bytes only once
+        yield b''.join((FRAME_HEADER, buffer, b'\r\n'))
 
 @app.route('/video')
 def video():
@@ -1,58 +1,20 @@
 #!/usr/bin/env python3
-from flask import Flask, Response, render_template_string, jsonify
+from flask import Flask, Response, jsonify
 from picamera2 import Picamera2
 import cv2
-import numpy as np
 import threading
 import time
-
-# ---------------------------
-# Unripe Percentage Calculator (your class, simplified to return results)
-# ---------------------------
-class UnripePercentageCalculator:
-    def __init__(self):
-        self.color_ranges = {
-            'unripe_green': ((30, 30, 50), (80, 255, 200)),
-            'unripe_whitish': ((0, 0, 100), (180, 50, 200)),
-            'unripe_light_red': ((0, 30, 100), (15, 100, 200)),
-            'ripe_red': ((0, 50, 50), (10, 255, 255)),
-            'ripe_dark_red': ((170, 50, 50), (180, 255, 255)),
-            'transitional_yellow': ((15, 50, 50), (30, 255, 255)),
-            'transitional_light_red': ((0, 20, 100), (20, 80, 255))
-        }
-
-    def _mask(self, image, keys):
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        combined = np.zeros(hsv.shape[:2], dtype=np.uint8)
-        for k in keys:
-            lower, upper = self.color_ranges[k]
-            mask = cv2.inRange(hsv, lower, upper)
-            combined |= mask
-        return combined
-
-    def calculate(self, image):
-        unripe_mask = self._mask(image, ['unripe_green','unripe_whitish','unripe_light_red'])
-        ripe_mask = self._mask(image, ['ripe_red','ripe_dark_red'])
-        transitional_mask = self._mask(image, ['transitional_yellow','transitional_light_red'])
-
-        total = image.shape[0] * image.shape[1]
-        unripe = np.sum(unripe_mask > 0)
-        ripe = np.sum(ripe_mask > 0)
-        transitional = np.sum(transitional_mask > 0)
-
-        return {
-            "unripe_pct": round(unripe/total*100, 2),
-            "ripe_pct": round(ripe/total*100, 2),
-            "transitional_pct": round(transitional/total*100, 2),
-            "total_pixels": total
-        }
+from ripeness import UnripePercentageCalculator, warm_up
 
 # ---------------------------
 # Flask app + camera
 # ---------------------------
 app = Flask(__name__)
+calculator = UnripePercentageCalculator()
+warm_up()  # Compile now so the first /process request doesn't pay the JIT cost
 picam2 = Picamera2()
-config = picam2.create_video_configuration(main={"size": (640, 480)})
+# RGB888 frames are BGR-ordered in memory, which imencode takes without conversion
+config = picam2.create_video_configuration(main={"size": (640, 480), "format": "RGB888"})
 picam2.configure(config)
 picam2.start()
 
@@ -70,20 +32,20 @@ def capture_loop():
 
 threading.Thread(target=capture_loop, daemon=True).start()
 
+# Multipart part header, joined with each JPEG into a single chunk per frame
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
 def gen_frames():
     global last_frame
     while True:
         with lock:
             if last_frame is None:
                 continue
-            frame = cv2.cvtColor(last_frame, cv2.COLOR_RGB2BGR)
-            _, buffer = cv2.imencode('.jpg', frame)
-            jpg = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpg + b'\r\n')
+            _, buffer = cv2.imencode('.jpg', last_frame)
+        yield b''.join((FRAME_HEADER, buffer, b'\r\n'))
 
-@app.route('/')
-def index():
-    return render_template_string('''
+# Static page, served as-is instead of going through Jinja on every request
+INDEX_HTML = '''
     <html>
       <head>
         <title>Tomato Ripeness Analyzer</title>
@@ -109,7 +71,11 @@ def index():
         <div id="results"></div>
       </body>
     </html>
-    ''')
+    '''
+
+@app.route('/')
+def index():
+    return INDEX_HTML
 
 @app.route('/video')
 def video():
@@ -121,9 +87,9 @@ def process():
     with lock:
         if last_frame is None:
             return jsonify({"error": "No frame captured"})
-        image_rgb = last_frame.copy()
-    calc = UnripePercentageCalculator()
-    results = calc.calculate(image_rgb)
+        # Only /process needs RGB, so convert here rather than on every streamed frame
+        image_rgb = cv2.cvtColor(last_frame, cv2.COLOR_BGR2RGB)
+    results = calculator.calculate(image_rgb)
     return jsonify(results)
 
 if __name__ == "__main__":
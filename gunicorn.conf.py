@@ -0,0 +1,7 @@
+# Gunicorn settings for the tomato streaming apps, see wsgi.py
+bind = '0.0.0.0:5000'
+worker_class = 'gthread'
+workers = 1                  # Single worker: the camera and capture thread live in one process
+threads = 8                  # Each open /video stream holds one thread
+worker_tmp_dir = '/dev/shm'  # Heartbeat file on tmpfs instead of the SD card
+keepalive = 65
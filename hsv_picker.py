@@ -4,17 +4,85 @@ HSV Color Picker Tool
 Allows users to upload an image and click on any coordinate to get HSV values
 """
 
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, request, jsonify
 import cv2
 import numpy as np
 import os
+import atexit
 import base64
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
 from io import BytesIO
 
 app = Flask(__name__)
 
-# Store uploaded images in memory (in production, use proper file storage)
-uploaded_images = {}
+# Uploaded files are kept on disk; only the most recently used decoded images stay in memory.
+# The upload dir is private to this process and removed on exit.
+UPLOAD_DIR = tempfile.mkdtemp(prefix='hsv_picker_')
+atexit.register(shutil.rmtree, UPLOAD_DIR, ignore_errors=True)
+MAX_STORED_UPLOADS = 100
+MAX_CACHED_BYTES = 128 * 1024 * 1024  # BGR + HSV copies, roughly one 12 MP photo plus a few small ones
+
+image_cache = OrderedDict()  # image_id -> {'bgr', 'hsv'}, least recently used first
+cache_bytes = 0
+cache_lock = threading.Lock()
+upload_lock = threading.Lock()
+
+def is_upload_id(image_id):
+    """Only canonical UUIDs name uploads, so client ids can't escape UPLOAD_DIR"""
+    try:
+        return str(uuid.UUID(str(image_id))) == image_id
+    except ValueError:
+        return False
+
+def entry_size(entry):
+    return entry['bgr'].nbytes + entry['hsv'].nbytes
+
+def cache_image(image_id, entry):
+    """Add a decoded image to the in-memory LRU cache, evicting the oldest entries past MAX_CACHED_BYTES"""
+    global cache_bytes
+    with cache_lock:
+        if image_id in image_cache:
+            cache_bytes -= entry_size(image_cache[image_id])
+        image_cache[image_id] = entry
+        image_cache.move_to_end(image_id)
+        cache_bytes += entry_size(entry)
+        # The newest entry is always kept, even when it alone is over budget
+        while cache_bytes > MAX_CACHED_BYTES and len(image_cache) > 1:
+            _, evicted = image_cache.popitem(last=False)
+            cache_bytes -= entry_size(evicted)
+
+def store_upload(image_id, file_data):
+    """Write the uploaded bytes to disk and prune the oldest stored uploads"""
+    with open(os.path.join(UPLOAD_DIR, image_id), 'wb') as f:
+        f.write(file_data)
+    with upload_lock:
+        stored = [entry for entry in os.scandir(UPLOAD_DIR)
+                  if entry.is_file(follow_symlinks=False) and is_upload_id(entry.name)]
+        stored.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in stored[:-MAX_STORED_UPLOADS]:
+            os.remove(entry.path)
+
+def load_image(image_id):
+    """Return the decoded image for image_id from the cache or disk, or None if unknown"""
+    if not is_upload_id(image_id):
+        return None
+    with cache_lock:
+        if image_id in image_cache:
+            image_cache.move_to_end(image_id)
+            return image_cache[image_id]
+    path = os.path.join(UPLOAD_DIR, image_id)
+    if not os.path.exists(path):
+        return None
+    image = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    entry = {'bgr': image, 'hsv': cv2.cvtColor(image, cv2.COLOR_BGR2HSV)}
+    cache_image(image_id, entry)
+    return entry
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -36,14 +104,20 @@ def upload_file():
             return jsonify({'error': 'Invalid image file'})
         
         # Generate unique ID for this image
-        import uuid
         image_id = str(uuid.uuid4())
         
-        # Store image in memory
-        uploaded_images[image_id] = image
+        # Persist the upload and cache it decoded, with its HSV conversion done once up front
+        store_upload(image_id, file_data)
+        cache_image(image_id, {
+            'bgr': image,
+            'hsv': cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        })
         
-        # Convert to base64 for display
-        _, buffer = cv2.imencode('.jpg', image)
+        # Convert to base64 for display, JPEG uploads are sent back as-is
+        if file_data[:3] == b'\xff\xd8\xff':
+            buffer = file_data
+        else:
+            _, buffer = cv2.imencode('.jpg', image)
         image_base64 = base64.b64encode(buffer).decode('utf-8')
         
         return jsonify({
@@ -67,25 +141,22 @@ def get_color_at_coordinate():
         x = int(data.get('x', 0))
         y = int(data.get('y', 0))
         
-        if image_id not in uploaded_images:
+        entry = load_image(image_id)
+        if entry is None:
             return jsonify({'error': 'Image not found'})
         
-        image = uploaded_images[image_id]
+        image = entry['bgr']
+        hsv_image = entry['hsv']
         
         # Check if coordinates are within image bounds
         if x < 0 or x >= image.shape[1] or y < 0 or y >= image.shape[0]:
             return jsonify({'error': 'Coordinates out of bounds'})
         
-        # Get BGR values at the coordinate
-        bgr_values = image[y, x]
-        
-        # Convert BGR to RGB
-        rgb_values = [int(bgr_values[2]), int(bgr_values[1]), int(bgr_values[0])]
+        # Get BGR values at the coordinate, reversed to RGB
+        rgb_values = image[y, x, ::-1].tolist()
         
-        # Convert BGR to HSV
-        bgr_pixel = np.uint8([[bgr_values]])
-        hsv_pixel = cv2.cvtColor(bgr_pixel, cv2.COLOR_BGR2HSV)
-        hsv_values = [int(hsv_pixel[0][0][0]), int(hsv_pixel[0][0][1]), int(hsv_pixel[0][0][2])]
+        # HSV was precomputed on upload, so this is a direct lookup
+        hsv_values = hsv_image[y, x].tolist()
         
         return jsonify({
             'rgb': rgb_values,
@@ -96,9 +167,8 @@ def get_color_at_coordinate():
     except Exception as e:
         return jsonify({'error': f'Error getting color: {str(e)}'})
 
-@app.route('/')
-def index():
-    return render_template_string('''
+# Static page, served as-is instead of going through Jinja on every request
+INDEX_HTML = '''
     <!DOCTYPE html>
     <html>
     <head>
@@ -341,7 +411,11 @@ def index():
         </script>
     </body>
     </html>
-    ''')
+    '''
+
+@app.route('/')
+def index():
+    return INDEX_HTML
 
 if __name__ == '__main__':
     print("🎨 HSV Color Picker Tool")
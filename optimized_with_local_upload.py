@@ -1,112 +1,176 @@
 #!/usr/bin/env python3
-from flask import Flask, Response, render_template_string, jsonify, request
-from picamera2 import Picamera2
+from flask import Flask, Response, jsonify, request
+from picamera2 import Picamera2, MappedArray
+from picamera2.encoders import JpegEncoder
+from picamera2.outputs import FileOutput
+from multiprocessing import shared_memory
 import libcamera
+import atexit
+import io
+import itertools
+import multiprocessing
+import os
+import queue
 import cv2
 import numpy as np
 import threading
 import time
-
-# ---------------------------
-# Unripe Percentage Calculator
-# ---------------------------
-class UnripePercentageCalculator:
-    def __init__(self):
-        self.color_ranges = {
-            'unripe_green': ((30, 30, 50), (80, 255, 200)),
-            'unripe_whitish': ((0, 0, 100), (180, 50, 200)),
-            'unripe_light_red': ((0, 30, 100), (15, 100, 200)),
-            'ripe_red': ((0, 50, 50), (10, 255, 255)),
-            'ripe_dark_red': ((170, 50, 50), (180, 255, 255)),
-            'transitional_yellow': ((15, 50, 50), (30, 255, 255)),
-            'transitional_light_red': ((0, 20, 100), (20, 80, 255))
-        }
-
-    def _mask(self, image, keys):
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        combined = np.zeros(hsv.shape[:2], dtype=np.uint8)
-        for k in keys:
-            lower, upper = self.color_ranges[k]
-            mask = cv2.inRange(hsv, lower, upper)
-            combined |= mask
-        return combined
-
-    def calculate(self, image):
-        unripe_mask = self._mask(image, ['unripe_green','unripe_whitish','unripe_light_red'])
-        ripe_mask = self._mask(image, ['ripe_red','ripe_dark_red'])
-        transitional_mask = self._mask(image, ['transitional_yellow','transitional_light_red'])
-
-        total = image.shape[0] * image.shape[1]
-        unripe = np.sum(unripe_mask > 0)
-        ripe = np.sum(ripe_mask > 0)
-        transitional = np.sum(transitional_mask > 0)
-
-        return {
-            "unripe_pct": round(unripe/total*100, 2),
-            "ripe_pct": round(ripe/total*100, 2),
-            "transitional_pct": round(transitional/total*100, 2),
-            "total_pixels": total
-        }
+from ripeness import UnripePercentageCalculator, warm_up
 
 # ---------------------------
 # Flask app + camera - ULTRA LOW LATENCY VERSION
 # ---------------------------
 app = Flask(__name__)
+calculator = UnripePercentageCalculator()
+
+# Ring of recent YUV420 frames (rows x stride) in shared memory: capture_loop overwrites
+# the oldest slot that no /process job has checked out, the analytics process reads the rest
+FRAME_HISTORY = 8
+# Leaves capture_loop a free slot besides the one it is writing while a job is pending
+MAX_POOLED_FRAMES = FRAME_HISTORY - 2
+FRAME_SHAPE = (FRAME_HISTORY, 480 * 3 // 2, 640)
+frame_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(FRAME_SHAPE)))
+atexit.register(frame_shm.unlink)
+frame_buffers = np.ndarray(FRAME_SHAPE, dtype=np.uint8, buffer=frame_shm.buf)
+
+def analytics_worker(jobs, results, parent_pid):
+    """Classify ring slots in a separate process, so analytics never competes for the streaming GIL"""
+    warm_up()  # Compile the kernel before the first job
+    while True:
+        try:
+            job_id, slots = jobs.get(timeout=1)
+        except queue.Empty:
+            # The parent was killed without running atexit (e.g. a SIGKILLed gunicorn worker),
+            # so free the ring's shared memory here instead of leaking it
+            if os.getppid() != parent_pid:
+                frame_shm.unlink()
+                return
+            continue
+        try:
+            # Camera frames are planar YUV420, convert for the HSV classifier. /process keeps
+            # the slots checked out until this job's reply arrives, so capture_loop can't
+            # overwrite them however late the job is picked up; they come oldest first.
+            images = [cv2.cvtColor(frame_buffers[i], cv2.COLOR_YUV2RGB_I420) for i in slots]
+            if len(images) == 1:
+                results.put((job_id, calculator.calculate(images[0])))
+            else:
+                results.put((job_id, calculator.calculate_batch(images)))
+        except Exception as e:
+            results.put((job_id, {"error": f"Analytics error: {e}"}))
+
+# Forked (the script can't be re-imported by spawn) before the camera starts and before this
+# process runs the Numba kernel, since GNU OpenMP isn't fork-safe once used
+analytics_context = multiprocessing.get_context("fork")
+analytics_jobs = analytics_context.Queue()
+analytics_results = analytics_context.Queue()
+# Not respawned if it dies: by then forking is no longer safe, so /process fails fast instead
+analytics_process = analytics_context.Process(target=analytics_worker,
+                                              args=(analytics_jobs, analytics_results, os.getpid()),
+                                              daemon=True)
+analytics_process.start()
+analytics_lock = threading.Lock()
+job_ids = itertools.count()
+pending_jobs = {}  # job_id -> checked-out slots, guarded by analytics_lock
+
+# Compile the kernel for /upload now that the worker is forked
+warm_up()
+
 picam2 = Picamera2()
 
 # Ultra-optimized camera configuration for minimum latency
 config = picam2.create_video_configuration(
-    main={"size": (640, 480), "format": "RGB888"},
-    buffer_count=1,      # Single buffer for minimum latency
+    main={"size": (640, 480), "format": "YUV420"},
+    encode="main",       # JPEG-encode the YUV stream directly, no RGB copy
     queue=False,         # No queuing
     transform=libcamera.Transform(hflip=0, vflip=0)  # No transforms
 )
 picam2.configure(config)
-picam2.start()
+# frame_buffers assumes the unpadded stride of a 640-wide YUV420 frame
+stride = picam2.stream_configuration("main")["stride"]
+if stride != FRAME_SHAPE[2]:
+    raise RuntimeError(f"Expected a YUV420 stride of {FRAME_SHAPE[2]}, camera reports {stride}")
+
+# JPEG frames written by the camera's encoder thread, shared with every /video client
+class StreamingOutput(io.BufferedIOBase):
+    def __init__(self):
+        self.frame = None
+        self.seq = 0  # Bumped per frame so readers can tell new frames from repeats
+        self.condition = threading.Condition()
+
+    def write(self, buf):
+        with self.condition:
+            self.frame = buf
+            self.seq += 1
+            self.condition.notify_all()
 
-# Pre-allocate arrays to avoid memory allocation during capture
-frame_buffer = np.zeros((480, 640, 3), dtype=np.uint8)
-lock = threading.Lock()
-last_frame = None
-frame_ready = threading.Event()
+stream_output = StreamingOutput()
+picam2.start_recording(JpegEncoder(q=60), FileOutput(stream_output))  # Lower quality for speed
+
+lock = threading.Lock()  # Guards the slot bookkeeping below
+frames_captured = 0
+slot_frames = [0] * FRAME_HISTORY  # Capture number held by each slot, 0 while empty or being written
+slot_readers = [0] * FRAME_HISTORY  # Pending /process jobs that have each slot checked out
+
+def release_slots(slots):
+    with lock:
+        for i in slots:
+            slot_readers[i] -= 1
 
 # Background thread to continuously grab frames
 def capture_loop():
-    global last_frame
+    global frames_captured
     while True:
         try:
-            # Use capture_array with pre-allocated buffer for speed
-            frame = picam2.capture_array()
+            # Copy straight from the camera buffer, no per-frame allocation
+            request = picam2.capture_request()
+            try:
+                with lock:
+                    free = [i for i in range(FRAME_HISTORY) if not slot_readers[i]]
+                    if not free:
+                        continue  # Every slot is still being read, drop this frame
+                    slot = min(free, key=slot_frames.__getitem__)
+                    slot_frames[slot] = 0
+                with MappedArray(request, "main") as m:
+                    np.copyto(frame_buffers[slot], m.array)
+            finally:
+                request.release()
             with lock:
-                last_frame = frame
-                frame_ready.set()
+                frames_captured += 1
+                slot_frames[slot] = frames_captured
         except Exception as e:
             print(f"Capture error: {e}")
             time.sleep(0.001)
 
 threading.Thread(target=capture_loop, daemon=True).start()
 
+# Multipart part header, joined with each JPEG into a single chunk per frame
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# Below the camera's 30 fps, so the pacer actually thins the stream
+MAX_STREAM_FPS = 20
+FRAME_INTERVAL = 1 / MAX_STREAM_FPS
+
 def gen_frames():
-    global last_frame
+    last_seq = 0
+    next_emit_time = 0.0
     while True:
-        frame_ready.wait()  # Wait for new frame
-        with lock:
-            if last_frame is None:
-                continue
-            frame = last_frame
-            frame_ready.clear()
-        
-        # Ultra-fast JPEG encoding with minimal quality
-        _, buffer = cv2.imencode('.jpg', frame, [
-            cv2.IMWRITE_JPEG_QUALITY, 60,  # Lower quality for speed
-            cv2.IMWRITE_JPEG_OPTIMIZE, 1   # Fast encoding
-        ])
-        jpg = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpg + b'\r\n')
+        # Frames are already JPEG-encoded from the YUV420 stream, just forward the bytes.
+        # A frame that arrived while the client was still receiving is sent right away.
+        with stream_output.condition:
+            stream_output.condition.wait_for(lambda: stream_output.seq != last_seq)
+            jpg = stream_output.frame
+            last_seq = stream_output.seq
+        # Never send the same frame twice, and drop frames above the pacing rate
+        now = time.monotonic()
+        if now < next_emit_time:
+            continue
+        # Step the schedule rather than restarting it from now, so a frame arriving a little
+        # late doesn't push every later frame back; a client that fell behind gets no backlog
+        next_emit_time = max(next_emit_time + FRAME_INTERVAL, now)
+        yield b''.join((FRAME_HEADER, jpg, b'\r\n'))
 
-@app.route('/')
-def index():
-    return render_template_string('''
+# Static page, served as-is instead of going through Jinja on every request
+INDEX_HTML = '''
     <html>
       <head>
         <title>Tomato Ripeness Analyzer - Ultra Low Latency</title>
@@ -120,8 +184,8 @@ def index():
           .upload-section { margin: 20px 0; padding: 15px; border: 2px dashed #ccc; border-radius: 5px; }
         </style>
         <script>
-          async function processCamera() {
-            let res = await fetch("/process");
+          async function processCamera(frames = 1) {
+            let res = await fetch(`/process?frames=${frames}`);
             let data = await res.json();
             document.getElementById("results").innerHTML = formatResults(data);
           }
@@ -161,6 +225,7 @@ def index():
 
           <div class="controls">
             <button onclick="processCamera()">Process Current Frame</button>
+            <button onclick="processCamera(6)">Average Recent Frames</button>
           </div>
 
           <div class="upload-section">
@@ -173,7 +238,11 @@ def index():
         </div>
       </body>
     </html>
-    ''')
+    '''
+
+@app.route('/')
+def index():
+    return INDEX_HTML
 
 @app.route('/video')
 def video():
@@ -181,14 +250,39 @@ def video():
 
 @app.route('/process')
 def process_camera():
-    global last_frame
-    with lock:
-        if last_frame is None:
+    # ?frames=N pools the last N frames for a steadier reading
+    frames = max(1, min(request.args.get('frames', 1, type=int), MAX_POOLED_FRAMES))
+
+    # Only slot indices cross the process boundary, the worker reads the pixels from shared memory
+    with analytics_lock:
+        if not analytics_process.is_alive():
+            # No replies will come, so hand every checked-out slot back to capture_loop
+            for pending_slots in pending_jobs.values():
+                release_slots(pending_slots)
+            pending_jobs.clear()
+            return jsonify({"error": "Analytics worker not running"})
+        # Check out the newest complete slots, oldest first, so capture_loop leaves them alone until the reply
+        with lock:
+            slots = sorted((i for i in range(FRAME_HISTORY) if slot_frames[i]),
+                           key=slot_frames.__getitem__)[-frames:]
+            for i in slots:
+                slot_readers[i] += 1
+        if not slots:
             return jsonify({"error": "No frame captured"})
-        image_rgb = last_frame.copy()
-    
-    calc = UnripePercentageCalculator()
-    results = calc.calculate(image_rgb)
+        job_id = next(job_ids)
+        pending_jobs[job_id] = slots
+        analytics_jobs.put((job_id, slots))
+        try:
+            # A late reply left over from a request that timed out only releases its slots
+            while True:
+                reply_id, results = analytics_results.get(timeout=5)
+                release_slots(pending_jobs.pop(reply_id))
+                if reply_id == job_id:
+                    break
+        except queue.Empty:
+            if not analytics_process.is_alive():
+                release_slots(pending_jobs.pop(job_id))
+            return jsonify({"error": "Analytics worker not responding"})
     return jsonify(results)
 
 @app.route('/upload', methods=['POST'])
@@ -201,8 +295,7 @@ def upload_image():
     if image is None:
         return jsonify({"error": "Invalid image"})
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    calc = UnripePercentageCalculator()
-    results = calc.calculate(image_rgb)
+    results = calculator.calculate(image_rgb)
     return jsonify(results)
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""HSV ripeness classification shared by the camera apps"""
+import cv2
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional, calculate falls back to OpenCV masks
+    njit = None
+
+# ---------------------------
+# Unripe Percentage Calculator
+# ---------------------------
+if njit is not None:
+    # OpenCV's fixed-point RGB2HSV division tables (hsv_shift = 12, hue range 180),
+    # so the kernel's HSV values are bit-exact with cv2.cvtColor
+    divisors = np.arange(1, 256)
+    sdiv_table = np.zeros(256, dtype=np.int32)
+    sdiv_table[1:] = np.round((255 << 12) / divisors)
+    hdiv_table = np.zeros(256, dtype=np.int32)
+    hdiv_table[1:] = np.round((180 << 12) / (6.0 * divisors))
+
+    @njit(parallel=True, cache=True)
+    def classify(rgb, lut, category_bits):
+        """Convert to HSV and count unripe/ripe/transitional pixels in a single pass over the RGB frame"""
+        unripe = 0
+        ripe = 0
+        transitional = 0
+        for y in prange(rgb.shape[0]):
+            for x in range(rgb.shape[1]):
+                r = np.int32(rgb[y, x, 0])
+                g = np.int32(rgb[y, x, 1])
+                b = np.int32(rgb[y, x, 2])
+                v = max(r, g, b)
+                diff = v - min(r, g, b)
+                s = (diff * sdiv_table[v] + (1 << 11)) >> 12
+                if v == r:
+                    h = g - b
+                elif v == g:
+                    h = b - r + 2 * diff
+                else:
+                    h = r - g + 4 * diff
+                h = (h * hdiv_table[diff] + (1 << 11)) >> 12
+                if h < 0:
+                    h += 180
+
+                code = lut[h, 0] & lut[s, 1] & lut[v, 2]
+                if code & category_bits[0]:
+                    unripe += 1
+                if code & category_bits[1]:
+                    ripe += 1
+                if code & category_bits[2]:
+                    transitional += 1
+        return unripe, ripe, transitional
+else:
+    classify = None
+
+class UnripePercentageCalculator:
+    def __init__(self):
+        self.color_ranges = {
+            'unripe_green': ((30, 30, 50), (80, 255, 200)),
+            'unripe_whitish': ((0, 0, 100), (180, 50, 200)),
+            'unripe_light_red': ((0, 30, 100), (15, 100, 200)),
+            'ripe_red': ((0, 50, 50), (10, 255, 255)),
+            'ripe_dark_red': ((170, 50, 50), (180, 255, 255)),
+            'transitional_yellow': ((15, 50, 50), (30, 255, 255)),
+            'transitional_light_red': ((0, 20, 100), (20, 80, 255))
+        }
+        # Percentages converge well below camera resolution, so larger frames
+        # are area-averaged down to classify_size (width, height) first
+        self.classify_size = (160, 120)
+        self.max_pixels = 40_000
+        self.categories = {
+            'unripe': ['unripe_green', 'unripe_whitish', 'unripe_light_red'],
+            'ripe': ['ripe_red', 'ripe_dark_red'],
+            'transitional': ['transitional_yellow', 'transitional_light_red']
+        }
+        self.category_ranges = {
+            name: [self.color_ranges[k] for k in keys]
+            for name, keys in self.categories.items()
+        }
+        # Per-channel bit LUT: bit i of channel_lut[value, c] is set when value lies inside
+        # range i on channel c, so ANDing the H, S and V lookups of a pixel gives exactly
+        # the ranges it falls in. category_bits holds each category's bits, in category order.
+        self.channel_lut = np.zeros((256, 3), dtype=np.uint8)
+        self.category_bits = np.zeros(len(self.categories), dtype=np.uint8)
+        bit = 0
+        for idx, name in enumerate(self.categories):
+            for lower, upper in self.category_ranges[name]:
+                for c in range(3):
+                    self.channel_lut[lower[c]:upper[c] + 1, c] |= 1 << bit
+                self.category_bits[idx] |= 1 << bit
+                bit += 1
+
+    def _downsample(self, image):
+        if image.shape[0] * image.shape[1] > self.max_pixels:
+            image = cv2.resize(image, self.classify_size, interpolation=cv2.INTER_AREA)
+        return image
+
+    def _count(self, image):
+        if classify is not None:
+            # HSV is computed per pixel inside the kernel, no HSV frame is materialised
+            return classify(image, self.channel_lut, self.category_bits)
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+        h, s, v = cv2.split(cv2.LUT(hsv, self.channel_lut.reshape(1, 256, 3)))
+        codes = h & s & v
+        return tuple(cv2.countNonZero(codes & bits) for bits in self.category_bits)
+
+    def _results(self, counts, total):
+        unripe, ripe, transitional = counts
+        return {
+            "unripe_pct": round(unripe/total*100, 2),
+            "ripe_pct": round(ripe/total*100, 2),
+            "transitional_pct": round(transitional/total*100, 2),
+            "total_pixels": total
+        }
+
+    def calculate(self, image):
+        image = self._downsample(image)
+        return self._results(self._count(image), image.shape[0] * image.shape[1])
+
+    def calculate_batch(self, images):
+        """Pooled percentages over several same-sized frames"""
+        # Stack the downsampled frames into one tall image so they are classified in a single call
+        stacked = np.concatenate([self._downsample(image) for image in images])
+        return self._results(self._count(stacked), stacked.shape[0] * stacked.shape[1])
+
+def warm_up():
+    """Compile the Numba kernel now instead of on the first request; call after forking any worker processes"""
+    UnripePercentageCalculator().calculate(np.zeros((8, 8, 3), dtype=np.uint8))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the Numba ripeness kernel against the OpenCV fallback
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+import ripeness
+
+pytestmark = pytest.mark.skipif(ripeness.classify is None, reason="numba not installed")
+
+def fallback_counts(calculator, image, monkeypatch):
+    """Counts from the cv2.cvtColor + cv2.LUT path in _count"""
+    with monkeypatch.context() as m:
+        m.setattr(ripeness, "classify", None)
+        return calculator._count(image)
+
+def kernel_hsv(rgb):
+    """Read one pixel's HSV back out of the kernel, three bits per call via probe LUTs"""
+    image = np.array(rgb, dtype=np.uint8).reshape(1, 1, 3)
+    bits = np.array([1, 2, 4], dtype=np.uint8)
+    hsv = []
+    for c in range(3):
+        value = 0
+        for shift in (0, 3, 6):
+            lut = np.full((256, 3), 0xFF, dtype=np.uint8)
+            lut[:, c] = (np.arange(256) >> shift) & 7
+            for i, count in enumerate(ripeness.classify(image, lut, bits)):
+                value |= count << (shift + i)
+        hsv.append(value)
+    return hsv
+
+def test_random_frames_match_fallback(monkeypatch):
+    calculator = ripeness.UnripePercentageCalculator()
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for h, w in ((120, 160), (37, 53), (1, 1))]
+    frames.append(cv2.cvtColor(cv2.imread("test.jpg"), cv2.COLOR_BGR2RGB))
+    for frame in frames:
+        assert calculator._count(frame) == fallback_counts(calculator, frame, monkeypatch)
+
+def test_hue_wrap_and_saturation_edges_match_cvtcolor():
+    pixels = []
+    for v in (1, 2, 3, 127, 128, 254, 255):
+        # Red is the max and blue exceeds green: the hue goes negative and wraps past 180
+        pixels += [(v, 0, b) for b in range(v + 1)]
+        pixels += [(v, g, g + 1) for g in range(v)]
+        # diff 0 (grey, s = 0), diff 1 (smallest saturation) and min 0 (s = 255)
+        pixels += [(v, v, v), (v, v - 1, v), (v, v, v - 1), (v, 0, v), (0, v, 0)]
+    pixels += [(v, v, v) for v in range(256)]
+    expected = cv2.cvtColor(np.array(pixels, dtype=np.uint8).reshape(-1, 1, 3), cv2.COLOR_RGB2HSV)
+    for rgb, hsv in zip(pixels, expected[:, 0]):
+        assert kernel_hsv(rgb) == hsv.tolist(), rgb
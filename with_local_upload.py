@@ -1,60 +1,43 @@
 #!/usr/bin/env python3
-from flask import Flask, Response, render_template_string, jsonify, request
+from flask import Flask, Response, jsonify, request
 from picamera2 import Picamera2
+from picamera2.encoders import JpegEncoder
+from picamera2.outputs import FileOutput
 import cv2
+import io
 import numpy as np
 import threading
 import time
-
-# ---------------------------
-# Unripe Percentage Calculator
-# ---------------------------
-class UnripePercentageCalculator:
-    def __init__(self):
-        self.color_ranges = {
-            'unripe_green': ((30, 30, 50), (80, 255, 200)),
-            'unripe_whitish': ((0, 0, 100), (180, 50, 200)),
-            'unripe_light_red': ((0, 30, 100), (15, 100, 200)),
-            'ripe_red': ((0, 50, 50), (10, 255, 255)),
-            'ripe_dark_red': ((170, 50, 50), (180, 255, 255)),
-            'transitional_yellow': ((15, 50, 50), (30, 255, 255)),
-            'transitional_light_red': ((0, 20, 100), (20, 80, 255))
-        }
-
-    def _mask(self, image, keys):
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        combined = np.zeros(hsv.shape[:2], dtype=np.uint8)
-        for k in keys:
-            lower, upper = self.color_ranges[k]
-            mask = cv2.inRange(hsv, lower, upper)
-            combined |= mask
-        return combined
-
-    def calculate(self, image):
-        unripe_mask = self._mask(image, ['unripe_green','unripe_whitish','unripe_light_red'])
-        ripe_mask = self._mask(image, ['ripe_red','ripe_dark_red'])
-        transitional_mask = self._mask(image, ['transitional_yellow','transitional_light_red'])
-
-        total = image.shape[0] * image.shape[1]
-        unripe = np.sum(unripe_mask > 0)
-        ripe = np.sum(ripe_mask > 0)
-        transitional = np.sum(transitional_mask > 0)
-
-        return {
-            "unripe_pct": round(unripe/total*100, 2),
-            "ripe_pct": round(ripe/total*100, 2),
-            "transitional_pct": round(transitional/total*100, 2),
-            "total_pixels": total
-        }
+from ripeness import UnripePercentageCalculator, warm_up
 
 # ---------------------------
 # Flask app + camera
 # ---------------------------
 app = Flask(__name__)
+calculator = UnripePercentageCalculator()
+warm_up()  # Compile now so the first /process request doesn't pay the JIT cost
 picam2 = Picamera2()
-config = picam2.create_video_configuration(main={"size": (640, 480)})
+config = picam2.create_video_configuration(main={"size": (640, 480), "format": "YUV420"},
+                                           encode="main")
 picam2.configure(config)
-picam2.start()
+# COLOR_YUV2RGB_I420 in /process needs the planes packed without row padding
+stride = picam2.stream_configuration("main")["stride"]
+if stride != 640:
+    raise RuntimeError(f"Expected a YUV420 stride of 640, camera reports {stride}")
+
+# JPEG frames written by the camera's encoder thread, shared with every /video client
+class StreamingOutput(io.BufferedIOBase):
+    def __init__(self):
+        self.frame = None
+        self.condition = threading.Condition()
+
+    def write(self, buf):
+        with self.condition:
+            self.frame = buf
+            self.condition.notify_all()
+
+stream_output = StreamingOutput()
+picam2.start_recording(JpegEncoder(), FileOutput(stream_output))
 
 lock = threading.Lock()
 last_frame = None
@@ -70,20 +53,19 @@ def capture_loop():
 
 threading.Thread(target=capture_loop, daemon=True).start()
 
+# Multipart part header, joined with each JPEG into a single chunk per frame
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
 def gen_frames():
-    global last_frame
     while True:
-        with lock:
-            if last_frame is None:
-                continue
-            frame = cv2.cvtColor(last_frame, cv2.COLOR_RGB2BGR)
-            _, buffer = cv2.imencode('.jpg', frame)
-            jpg = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpg + b'\r\n')
-
-@app.route('/')
-def index():
-    return render_template_string('''
+        # Frames are already JPEG-encoded from the YUV420 stream, just forward the bytes
+        with stream_output.condition:
+            stream_output.condition.wait()
+            jpg = stream_output.frame
+        yield b''.join((FRAME_HEADER, jpg, b'\r\n'))
+
+# Static page, served as-is instead of going through Jinja on every request
+INDEX_HTML = '''
     <html>
       <head>
         <title>Tomato Ripeness Analyzer</title>
@@ -133,7 +115,11 @@ def index():
         <div id="results" style="margin-top:20px;"></div>
       </body>
     </html>
-    ''')
+    '''
+
+@app.route('/')
+def index():
+    return INDEX_HTML
 
 @app.route('/video')
 def video():
@@ -145,9 +131,9 @@ def process_camera():
     with lock:
         if last_frame is None:
             return jsonify({"error": "No frame captured"})
-        image_rgb = last_frame.copy()
-    calc = UnripePercentageCalculator()
-    results = calc.calculate(image_rgb)
+        # Camera frames are planar YUV420, convert for the HSV classifier
+        image_rgb = cv2.cvtColor(last_frame, cv2.COLOR_YUV2RGB_I420)
+    results = calculator.calculate(image_rgb)
     return jsonify(results)
 
 @app.route('/upload', methods=['POST'])
@@ -160,8 +146,7 @@ def upload_image():
     if image is None:
         return jsonify({"error": "Invalid image"})
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    calc = UnripePercentageCalculator()
-    results = calc.calculate(image_rgb)
+    results = calculator.calculate(image_rgb)
     return jsonify(results)
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for running a tomato streaming app under gunicorn
+Serves optimized_with_local_upload by default, set TOMATO_APP=with_local_upload for the other one
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import importlib
+import os
+
+app = importlib.import_module(os.environ.get('TOMATO_APP', 'optimized_with_local_upload')).app